@@ -1,40 +1,87 @@
 import io
+import os
 import re
 from copy import copy
 from datetime import datetime
-from typing import Dict, Any, Optional
+from html import escape
+from itertools import chain, islice
+from typing import IO, Dict, Any, Optional, Union
+import numpy as np
 import pandas as pd
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill
 from openpyxl.utils import get_column_letter
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import traceback
 
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = "string[pyarrow]"
+except ImportError:
+    TEXT_DTYPE = object
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 NUMERIC_TOLERANCE = 1
 
+# an upload as raw bytes, a path on disk, or an open binary file
+ExcelSource = Union[bytes, str, os.PathLike, IO[bytes]]
+
+# sheets are compared in worker processes once the uploads are large enough to repay the pool start-up
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+MAX_SHEET_WORKERS  = 4
+
+# sheets compared when the caller passes no sheets_config
+DEFAULT_SHEETS_CONFIG = {
+    'Gain Summary': {'header_row': 2, 'data_start_row': 3},
+    'ScheduleFA':         {'header_row': 8, 'data_start_row': 8},
+    'transaction_details':         {'header_row': 2, 'data_start_row': 3},
+    'transaction_details_by_gain':         {'header_row': 2, 'data_start_row': 3},
+    'dividend_transaction_details': {'header_row': 2, 'data_start_row': 3},
+}
+
 original_fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")  # light green
 website_fill  = PatternFill(start_color="FFFF99", end_color="FFFF99", fill_type="solid")  # light yellow
 diff_fill     = PatternFill(start_color="FBD9D3", end_color="FBD9D3", fill_type="solid")  # light red
 
+_NON_NUMERIC_RE = re.compile(r"[^\d\.\-]+")
+# ASCII-only equivalent of _NON_NUMERIC_RE for str.translate (non-ASCII text still goes through the regex)
+_NON_NUMERIC_ASCII = str.maketrans("", "", "".join(chr(c) for c in range(128) if chr(c) not in "0123456789.-"))
 
-def coerce_numeric(value):
-    if pd.isna(value) or value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return float(value)
-    s = str(value).strip()
-    if s == "":
+
+def _coerce_numeric_text(s):
+    s = s.strip()
+    if not s:
         return None
-    if s.startswith("(") and s.endswith(")"):
+    if s[0] == "(" and s[-1] == ")":
         s = "-" + s[1:-1]
-    s = s.replace(",", "")
-    s = re.sub(r"[^\d\.\-]+", "", s)
+    s = s.translate(_NON_NUMERIC_ASCII) if s.isascii() else _NON_NUMERIC_RE.sub("", s)
     try:
         return float(s)
-    except Exception:
+    except ValueError:
         return None
 
 
+def coerce_numeric(value):
+    if isinstance(value, str):
+        return _coerce_numeric_text(value)
+    if type(value) is float:
+        return None if value != value else value
+    if type(value) is int:
+        return float(value)
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _coerce_numeric_text(str(value))
+
+
 def to_int_or_none(value):
     num = coerce_numeric(value)
     if num is None:
@@ -46,6 +93,11 @@ def to_int_or_none(value):
 
 
 def norm_text(value):
+    # plain str / int cells are most of a sheet: skip the scalar pd.isna for them
+    if type(value) is str:
+        return value.strip()
+    if type(value) is int:
+        return str(value)
     if pd.isna(value) or value is None:
         return ""
     return str(value).strip()
@@ -63,14 +115,14 @@ def values_different(orig_val, web_val, tol=NUMERIC_TOLERANCE):
     return not values_equal(orig_val, web_val, tol=tol)
 
 
-def row_key(row, max_parts=2):
+def row_key(values, max_parts=2):
     key_parts = []
-    for col in row.index:
-        iv = to_int_or_none(row[col])
+    for v in values:
+        iv = to_int_or_none(v)
         if iv is not None:
             key_parts.append(("num", iv))
         else:
-            sv = norm_text(row[col])
+            sv = norm_text(v)
             if sv != "":
                 key_parts.append(("str", sv.lower()))
         if len(key_parts) >= max_parts:
@@ -78,12 +130,145 @@ def row_key(row, max_parts=2):
     return tuple(key_parts)
 
 
-def build_key_index(df, max_parts=2):
-    idx = {}
-    for i, row in df.iterrows():
-        k = row_key(row, max_parts=max_parts)
-        idx.setdefault(k, []).append(i)
-    return idx
+def numeric_view(s: pd.Series) -> np.ndarray:
+    """Vectorised coerce_numeric over a column; NaN where the scalar version returns None."""
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.to_numpy(dtype=float, na_value=np.nan)
+    # account numbers and amounts repeat down a column: parse each distinct text once,
+    # -1 codes (missing) pick the trailing NaN
+    codes, uniques = pd.factorize(s.astype(str))
+    parsed = np.array([_coerce_numeric_text(u) for u in uniques] + [None], dtype=float)[codes]
+    is_num = s.map(lambda v: isinstance(v, (int, float))).to_numpy(dtype=bool)
+    if is_num.any():
+        parsed[is_num] = s[is_num].astype(float).to_numpy()
+    return parsed
+
+
+def text_array(values):
+    return np.array([norm_text(v) for v in values], dtype=object)
+
+
+def text_series(texts) -> pd.Series:
+    """A text view as a Series; Arrow-backed when pyarrow is installed so .str ops run in C."""
+    return pd.Series(texts, dtype=TEXT_DTYPE)
+
+
+def column_views(df):
+    """Per-column (numeric, text) arrays, built once so the diff can run column-wise."""
+    columns = [df.iloc[:, ci] for ci in range(df.shape[1])]
+    return [numeric_view(c) for c in columns], [text_array(c) for c in columns]
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _numeric_diff_kernel(o, w, tol, both, diff):
+        for r in range(o.shape[0]):
+            for c in range(o.shape[1]):
+                a = o[r, c]
+                b = w[r, c]
+                ok = np.isfinite(a) and np.isfinite(b)
+                both[r, c] = ok
+                diff[r, c] = ok and abs(np.trunc(b) - np.trunc(a)) > tol
+
+
+def numeric_diff(o, w, tol=NUMERIC_TOLERANCE):
+    """For aligned 2-D numeric views: (both sides numeric, truncated values differ by more than tol)."""
+    if njit is not None:
+        both = np.empty(o.shape, dtype=np.bool_)
+        diff = np.empty(o.shape, dtype=np.bool_)
+        try:
+            _numeric_diff_kernel(o, w, float(tol), both, diff)
+            return both, diff
+        except Exception:
+            # e.g. an unreadable on-disk kernel cache; the NumPy path gives the same masks
+            traceback.print_exc()
+    both = np.isfinite(o) & np.isfinite(w)
+    with np.errstate(invalid="ignore"):
+        return both, np.abs(np.trunc(w) - np.trunc(o)) > tol
+
+
+def diff_matrix(orig_views, web_views, oi, wi, tol=NUMERIC_TOLERANCE):
+    """Vectorised values_different over aligned rows: cell (r, c) is True when
+    orig row oi[r] and web row wi[r] differ in column c."""
+    orig_nums, orig_texts = orig_views
+    web_nums, web_texts = web_views
+    both_int, mask = numeric_diff(np.stack(orig_nums, axis=1)[oi], np.stack(web_nums, axis=1)[wi], tol)
+    for ci in range(len(orig_nums)):
+        col_both = both_int[:, ci]
+        # purely numeric columns are already decided; only the others need the text compare
+        if col_both.all():
+            continue
+        text_diff = orig_texts[ci][oi] != web_texts[ci][wi]
+        mask[:, ci] = text_diff if not col_both.any() else np.where(col_both, mask[:, ci], text_diff)
+    return mask
+
+
+def row_keys(views, max_parts=2):
+    """row_key for every row as a uint64 fingerprint, filled column by column
+    with array masks. Each row takes its first max_parts non-empty cells, so the
+    scan stops as soon as every row is full (usually after the leading key
+    columns). Equal row_key tuples give equal fingerprints; the tagged parts
+    are hashed with pandas' vectorised 64-bit hash, so distinct keys colliding
+    is negligible at sheet sizes."""
+    nums, texts = views
+    if not nums:
+        return np.empty(0, dtype=np.uint64)
+    n = len(nums[0])
+    slots = [np.full(n, "", dtype=object) for _ in range(max_parts)]
+    filled = np.zeros(n, dtype=np.intp)
+    for num, text in zip(nums, texts):
+        open_rows = filled < max_parts
+        if not open_rows.any():
+            break
+        is_num = np.isfinite(num)
+        take_num = open_rows & is_num
+        take_str = open_rows & ~is_num & (text != "")
+        parts = np.full(n, "", dtype=object)
+        parts[take_num] = ["n%d" % v for v in np.trunc(num[take_num]).tolist()]
+        parts[take_str] = ["s" + v.lower() for v in text[take_str].tolist()]
+        take = take_num | take_str
+        for k, slot in enumerate(slots):
+            at = take & (filled == k)
+            slot[at] = parts[at]
+        filled += take
+    keys = pd.util.hash_array(slots[0])
+    for slot in slots[1:]:
+        keys = keys * np.uint64(0x100000001B3) ^ pd.util.hash_array(slot)
+    return keys
+
+
+def match_rows(orig_keys, web_keys, unique=False):
+    """Pair rows by key with a pandas hash join instead of Python dict lookups.
+
+    Each original row is matched to the first website row with the same key;
+    None keys never match and are dropped. With unique=True only the first row
+    per key is kept on either side. Returns (matched_orig, matched_web,
+    only_orig, only_web) as row positions in their original order."""
+    # row_keys fingerprints stay uint64 so the join runs on the integer hash table
+    if not isinstance(orig_keys, np.ndarray):
+        orig_keys = pd.Series(orig_keys, dtype=object)
+    if not isinstance(web_keys, np.ndarray):
+        web_keys = pd.Series(web_keys, dtype=object)
+    orig = pd.DataFrame({"key": orig_keys, "o": np.arange(len(orig_keys))})
+    web  = pd.DataFrame({"key": web_keys,  "w": np.arange(len(web_keys))})
+    orig = orig[orig["key"].notna()]
+    web  = web[web["key"].notna()]
+    if unique:
+        orig = orig.drop_duplicates(subset="key", keep="first")
+        web  = web.drop_duplicates(subset="key", keep="first")
+
+    first_web = web if unique else web.drop_duplicates(subset="key", keep="first")
+    # a left join keeps the original row order
+    merged = orig.merge(first_web, on="key", how="left", indicator=True)
+    both = merged["_merge"] == "both"
+    # website-only rows come from the same key arrays: one hashed membership test, no second row scan
+    only_web = web["w"].to_numpy()[~web["key"].isin(orig["key"]).to_numpy()]
+    return (
+        merged.loc[both, "o"].tolist(),
+        merged.loc[both, "w"].astype(np.int64).tolist(),
+        merged.loc[~both, "o"].tolist(),
+        only_web.tolist(),
+    )
 
 
 def safe_copy_cell_style(source_cell, target_cell):
@@ -101,6 +286,20 @@ def safe_copy_cell_style(source_cell, target_cell):
         pass
 
 
+def filled_cell(worksheet, value, fill, style_cache):
+    """WriteOnlyCell with `fill` applied. The fill is registered with the
+    workbook once; later cells reuse its StyleArray from style_cache (one dict
+    per output workbook) instead of looking the fill up again per cell."""
+    cell = WriteOnlyCell(worksheet, value=value)
+    style = style_cache.get(id(fill))
+    if style is None:
+        cell.fill = fill
+        style_cache[id(fill)] = copy(cell._style)
+    else:
+        cell._style = copy(style)
+    return cell
+
+
 def safe_get_column_width(worksheet, col_letter):
     try:
         if col_letter in worksheet.column_dimensions:
@@ -110,6 +309,26 @@ def safe_get_column_width(worksheet, col_letter):
         return None
 
 
+def column_widths(rows):
+    """Longest str() length per column position across rows."""
+    widths = []
+    for r in rows:
+        if len(r) > len(widths):
+            widths.extend([0] * (len(r) - len(widths)))
+        for col_idx, val in enumerate(r):
+            if val is not None:
+                n = len(str(val))
+                if n > widths[col_idx]:
+                    widths[col_idx] = n
+    return widths
+
+
+def set_column_widths(worksheet, widths):
+    # write-only sheets emit <cols> with the first row, so call this before appending
+    for col_idx, max_len in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 2, 50)
+
+
 def norm_for_json(v):
     if pd.isna(v) or v is None:
         return ""
@@ -121,388 +340,394 @@ def norm_for_json(v):
     return str(v)
 
 
-def make_safe_title(title: str, wb: openpyxl.workbook.workbook.Workbook) -> str:
+def json_column(s: pd.Series) -> list:
+    """norm_for_json over a whole column; typed numeric columns skip the per-cell checks."""
+    if s.dtype == bool or pd.api.types.is_integer_dtype(s.dtype) or pd.api.types.is_float_dtype(s.dtype):
+        out = s.tolist()
+        for i in np.flatnonzero(s.isna().to_numpy()):
+            out[i] = ""
+        return out
+    return [norm_for_json(v) for v in s.tolist()]
+
+
+def json_matrix(df) -> np.ndarray:
+    """(rows, cols) object matrix of norm_for_json values, normalised column by column."""
+    out = np.empty(df.shape, dtype=object)
+    for ci in range(df.shape[1]):
+        out[:, ci] = json_column(df.iloc[:, ci])
+    return out
+
+
+def triple_rows(orig, web, diff) -> list:
+    """Interleave (k, C) orig/web/diff matrices (or scalars) into k rows of o, w, d, o, w, d, ..."""
+    shape = np.broadcast(orig, web, diff).shape
+    out = np.empty(shape + (3,), dtype=object)
+    out[..., 0] = orig
+    out[..., 1] = web
+    out[..., 2] = diff
+    return out.reshape(shape[0], shape[1] * 3).tolist()
+
+
+def status_rows(vals, status) -> list:
+    """Rows of a (k, C) matrix with a trailing status column."""
+    out = np.empty((vals.shape[0], vals.shape[1] + 1), dtype=object)
+    out[:, :-1] = vals
+    out[:, -1] = status
+    return out.tolist()
+
+
+def acct_key_column(num, text):
+    """Account key per row: the integer as a string where num parses, else the
+    lower-cased text; missing for blank cells."""
+    text = np.asarray(text, dtype=object)
+    keys = text_series(text).str.lower().to_numpy(dtype=object, copy=True)
+    has_num = np.isfinite(num)
+    if has_num.any():
+        # Python ints, not int64: IBAN-style account numbers run past 19 digits
+        keys[has_num] = np.array([str(int(v)) for v in np.trunc(num[has_num]).tolist()], dtype=object)
+    keys[text == ""] = None
+    return text_series(keys)
+
+
+def date_iso(v):
+    try:
+        ts = pd.to_datetime(v, errors="coerce", dayfirst=True)
+        return None if pd.isna(ts) else ts.date().isoformat()
+    except Exception:
+        return None
+
+
+def composite_acct_key_column(df, views, key_cols, col_pos):
+    if any(col not in col_pos for col in key_cols):
+        return pd.Series([None] * len(df), dtype=object)
+    texts = views[1]
+    valid = np.ones(len(df), dtype=bool)
+    parts = []
+    for col in key_cols:
+        pos = col_pos[col]
+        text = text_series(texts[pos])
+        valid &= (text != "").to_numpy(dtype=bool)
+        if col.lower() == "account number":
+            parts.append(acct_key_column(views[0][pos], texts[pos]))
+        elif "date" in col.lower():
+            # parse each distinct value once; -1 codes (missing) pick the trailing None
+            codes, uniques = pd.factorize(df.iloc[:, pos])
+            iso = np.array([date_iso(u) for u in uniques] + [None], dtype=object)[codes]
+            parts.append(pd.Series(iso, dtype=object).fillna(text.str.lower()))
+        else:
+            parts.append(text.str.lower())
+    keys = parts[0].str.cat(parts[1:], sep="|") if len(parts) > 1 else parts[0]
+    return keys.where(valid)
+
+
+def open_workbook(data):
+    if isinstance(data, pd.ExcelFile):
+        return data
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    elif hasattr(data, "seek"):
+        data.seek(0)
+    # openpyxl, not calamine: calamine reads whitespace-only cells as blanks, which
+    # changes both the reported text and the dtype of otherwise-integer columns
+    return pd.ExcelFile(data, engine="openpyxl")
+
+
+def source_size(data) -> int:
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, (str, os.PathLike)):
+        return os.path.getsize(data)
+    pos = data.tell()
+    size = data.seek(0, io.SEEK_END)
+    data.seek(pos)
+    return size
+
+
+def worker_source(data):
+    """data in a form a worker process can reopen: paths and bytes pickle, open file objects don't."""
+    if isinstance(data, (bytes, bytearray, str, os.PathLike)):
+        return data
+    data.seek(0)
+    return data.read()
+
+
+def drop_rows(sdata):
+    """Release a sheet's structured rows once the report no longer needs them."""
+    for key in ("common_rows", "different_rows", "only_in_original_rows", "only_in_website_rows"):
+        if key in sdata:
+            sdata[key] = []
+
+
+def make_safe_title(title: str, used: set) -> str:
+    """Return a sheet title not yet in used, and record it there."""
     if title is None:
         title = ""
     max_len = 50
     base = title[:max_len]
     safe = base
     i = 1
-    while safe in wb.sheetnames:
+    while safe in used:
         suffix = f" ({i})"
         keep_len = max_len - len(suffix)
         safe = (base[:keep_len] + suffix) if keep_len > 0 else suffix[:max_len]
         i += 1
         if i > 999:
             break
+    used.add(safe)
     return safe
 
 
+def compare_sheet(original, website, sheet_name, cfg):
+    """Compare one configured sheet. original/website are pd.ExcelFile objects, or
+    xlsx bytes / paths when run in a worker process. Returns (summary_row, structured,
+    placeholders), where placeholders are the report titles to reserve for the sheet."""
+    original = open_workbook(original)
+    website  = open_workbook(website)
+    placeholders = []
+    try:
+        df_orig = original.parse(sheet_name=sheet_name, header=cfg['header_row'] - 1)
+        df_web  = website.parse(sheet_name=sheet_name, header=cfg['header_row'] - 1)
+
+        common_cols = [c for c in df_orig.columns if c in df_web.columns]
+
+        if sheet_name in ("ScheduleFA", "transaction_details", "transaction_details_by_gain","dividend_transaction_details"):
+            common_cols = [
+                c for c in common_cols 
+                if c != "Sl. No."
+            ]
+
+        structured_common = []
+        structured_diff   = []
+        structured_only_orig = []
+        structured_only_web  = []
+
+        if not common_cols:
+            placeholders.extend([sheet_name, f"{sheet_name} Common Rows"])
+            return [sheet_name, 0, 0, 0, 0, 0], {
+                "common_rows": structured_common,
+                "different_rows": structured_diff,
+                "only_in_original_rows": structured_only_orig,
+                "only_in_website_rows": structured_only_web,
+                "rows_compared": 0,
+                "cells_different": 0
+            }, placeholders
+
+        df_orig = df_orig[common_cols].copy()
+        df_web  = df_web[common_cols].copy()
+        col_pos = {c: i for i, c in enumerate(common_cols)}
+
+        placeholders.append(sheet_name)
+
+        diff_count       = 0
+        rows_compared    = 0
+
+        def make_tripled_headers():
+            headers = []
+            for col in common_cols:
+                headers.extend([f"{col} (Original)", f"{col} (Website)", f"{col} (Diff)"])
+            structured_common.append([h for h in headers])
+            structured_diff.append([h for h in headers])
+            structured_only_orig.append([h for h in headers])
+            structured_only_web.append([h for h in headers])
+
+        def make_simple_headers():
+            headers = [c for c in common_cols] + ["Row Status"]
+            structured_common.append([h for h in headers])
+            structured_diff.append([h for h in headers])
+            structured_only_orig.append([h for h in headers])
+            structured_only_web.append([h for h in headers])
+
+        if sheet_name in ("Gain Summary", "ScheduleFA", "transaction_details","transaction_details_by_gain","dividend_transaction_details") and ("Account Number" in df_orig.columns) and ("Account Number" in df_web.columns):
+            make_tripled_headers()
+
+            preferred_keys = ["Account Number", "Investment Name", "Purchase Date",]
+            use_composite = all(k in df_orig.columns and k in df_web.columns for k in preferred_keys)
+            if use_composite:
+                key_cols = preferred_keys
+            else:
+                key_cols = ["Account Number"]
+
+            if sheet_name == "dividend_transaction_details":
+                special_keys = ["Account Number", "symbol", "date received"]
+                if all(k in df_orig.columns and k in df_web.columns for k in special_keys):
+                    key_cols = special_keys
+
+            try:
+                df_orig = df_orig.drop_duplicates(subset=key_cols, keep="first").reset_index(drop=True)
+                df_web  = df_web.drop_duplicates(subset=key_cols, keep="first").reset_index(drop=True)
+            except Exception:
+                df_orig = df_orig.reset_index(drop=True)
+                df_web = df_web.reset_index(drop=True)
+
+            orig_vals = json_matrix(df_orig)
+            web_vals  = json_matrix(df_web)
+            orig_views = column_views(df_orig)
+            web_views  = column_views(df_web)
+
+            # Gain Summary
+            if sheet_name == "Gain Summary":
+                matched_orig, matched_web, only_orig, only_web = match_rows(
+                    row_keys(orig_views, max_parts=2), row_keys(web_views, max_parts=2),
+                )
+            else:
+                if len(key_cols) == 1 and key_cols[0] == "Account Number":
+                    acct_pos = col_pos["Account Number"]
+                    # parsed from the cell text, so e.g. a boolean account keys as "true", not 1
+                    orig_keys = acct_key_column(numeric_view(pd.Series(orig_views[1][acct_pos])), orig_views[1][acct_pos])
+                    web_keys  = acct_key_column(numeric_view(pd.Series(web_views[1][acct_pos])), web_views[1][acct_pos])
+                else:
+                    orig_keys = composite_acct_key_column(df_orig, orig_views, key_cols, col_pos)
+                    web_keys  = composite_acct_key_column(df_web, web_views, key_cols, col_pos)
+
+                matched_orig, matched_web, only_orig, only_web = match_rows(orig_keys, web_keys, unique=True)
+
+            oi = np.asarray(matched_orig, dtype=np.intp)
+            wi = np.asarray(matched_web, dtype=np.intp)
+            only_orig = np.asarray(only_orig, dtype=np.intp)
+            only_web  = np.asarray(only_web, dtype=np.intp)
+            diff_mask = diff_matrix(orig_views, web_views, oi, wi)
+            row_diff_counts = diff_mask.sum(axis=1)
+            is_diff = row_diff_counts > 0
+
+            # diff cell: numeric delta when both sides parse, "DIFF" otherwise, blank where the cells agree
+            d_oi, d_wi, d_mask = oi[is_diff], wi[is_diff], diff_mask[is_diff]
+            deltas = np.stack(web_views[0], axis=1)[d_wi] - np.stack(orig_views[0], axis=1)[d_oi]
+            diff_vals = np.full(d_mask.shape, "", dtype=object)
+            diff_vals[d_mask] = deltas.astype(object)[d_mask]
+            diff_vals[d_mask & np.isnan(deltas)] = "DIFF"
+
+            structured_only_orig.extend(triple_rows(orig_vals[only_orig], "", "Only in Original"))
+            structured_common.extend(triple_rows(orig_vals[oi[~is_diff]], orig_vals[oi[~is_diff]], ""))
+            structured_diff.extend(triple_rows(orig_vals[d_oi], web_vals[d_wi], diff_vals))
+            structured_only_web.extend(triple_rows("", web_vals[only_web], "Only in Website"))
+
+            rows_compared += len(only_orig) + len(d_oi) + len(only_web)
+            diff_count    += len(only_orig) + int(row_diff_counts.sum()) + len(only_web)
+
+        # General compare logic
+        else:
+            make_simple_headers()
+            orig_vals = json_matrix(df_orig)
+            web_vals  = json_matrix(df_web)
+            orig_views = column_views(df_orig)
+            web_views  = column_views(df_web)
+            matched_orig, matched_web, only_orig, only_web = match_rows(
+                row_keys(orig_views, max_parts=2), row_keys(web_views, max_parts=2),
+            )
+
+            oi = np.asarray(matched_orig, dtype=np.intp)
+            wi = np.asarray(matched_web, dtype=np.intp)
+            only_orig = np.asarray(only_orig, dtype=np.intp)
+            only_web  = np.asarray(only_web, dtype=np.intp)
+            diff_mask = diff_matrix(orig_views, web_views, oi, wi)
+            row_diff_counts = diff_mask.sum(axis=1)
+            is_diff = row_diff_counts > 0
+
+            structured_only_orig.extend(status_rows(orig_vals[only_orig], "Only in Original"))
+            structured_common.extend(status_rows(orig_vals[oi[~is_diff]], "Common"))
+            structured_diff.extend(status_rows(orig_vals[oi[is_diff]], "Different"))
+            structured_only_web.extend(status_rows(web_vals[only_web], "Only in Website"))
+
+            rows_compared += len(only_orig) + int(is_diff.sum()) + len(only_web)
+            diff_count    += len(only_orig) + int(row_diff_counts.sum()) + len(only_web)
+
+        summary_row = [sheet_name, rows_compared, diff_count, len(structured_common), len(structured_only_orig), len(structured_only_web)]
+        return summary_row, {
+            "common_rows": structured_common,
+            "different_rows": structured_diff,
+            "only_in_original_rows": structured_only_orig,
+            "only_in_website_rows": structured_only_web,
+            "rows_compared": rows_compared,
+            "cells_different": diff_count,
+            "_main_ws_name": sheet_name
+        }, placeholders
+
+    except Exception as e:
+        traceback.print_exc()
+        return [sheet_name, 0, f"ERROR: {e}", 0, 0, 0], {
+            "common_rows": [],
+            "different_rows": [],
+            "only_in_original_rows": [],
+            "only_in_website_rows": [],
+            "rows_compared": 0,
+            "cells_different": 0,
+            "error": str(e)
+        }, placeholders
+
+
 # Main compare function
-def compare_excel_with_gain_summary_inline_India(
-    original_bytes: bytes,
-    website_bytes: bytes,
+def _compare_core(
+    original_bytes: ExcelSource,
+    website_bytes: ExcelSource,
     sheets_config: Optional[Dict[str, Dict[str, int]]] = None,
-) -> Dict[str, Any]:
+):
+    """Compare every configured sheet without building the report workbook. Returns
+    (summary_rows, sheets_structured, reserved_titles, used_titles), where reserved_titles
+    are the report sheet titles claimed so far, in workbook order."""
 
     if sheets_config is None:
-        sheets_config = {
-            'Gain Summary': {'header_row': 2, 'data_start_row': 3},
-            'ScheduleFA':         {'header_row': 8, 'data_start_row': 8},
-            'transaction_details':         {'header_row': 2, 'data_start_row': 3},
-            'transaction_details_by_gain':         {'header_row': 2, 'data_start_row': 3},
-            'dividend_transaction_details': {'header_row': 2, 'data_start_row': 3},
-        }
+        sheets_config = DEFAULT_SHEETS_CONFIG
 
-    red_fill   = PatternFill(start_color="fbd9d3", end_color="fbd9d3", fill_type="solid")
-    green_fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-
-    original_wb = openpyxl.load_workbook(io.BytesIO(original_bytes))
-    website_wb  = openpyxl.load_workbook(io.BytesIO(website_bytes))
-    output_wb   = openpyxl.Workbook()
-    if 'Sheet' in output_wb.sheetnames:
-        output_wb.remove(output_wb['Sheet'])
+    used_titles = set()
+    reserved_titles = []
 
     summary_rows = [["Sheet", "Rows Compared", "Cells Different", "Common Rows", "Only in Original", "Only in Website"]]
 
     sheets_structured: Dict[str, Dict[str, Any]] = {}
 
-    def acct_key(v):
-        if pd.isna(v) or v is None:
-            return None
-        s = str(v).strip()
-        if s == "":
-            return None
-        num = to_int_or_none(s)
-        if num is not None:
-            return str(num)
-        return s.lower()
-
-    def composite_acct_key(row, key_cols):
-        parts = []
-        for col in key_cols:
-            if col not in row.index:
-                return None
-            v = row[col]
-            if pd.isna(v) or v is None:
-                return None
-            s = str(v).strip()
-            if s == "":
-                return None
-
-            if col.lower() == "account number":
-                num = to_int_or_none(v)
-                parts.append(str(num) if num is not None else s.lower())
-            elif "date" in col.lower():
-                try:
-                    ts = pd.to_datetime(v, errors="coerce", dayfirst=True)
-                    if pd.isna(ts):
-                        parts.append(s.lower())
-                    else:
-                        parts.append(ts.date().isoformat())
-                except Exception:
-                    parts.append(s.lower())
-            else:
-                parts.append(s.lower())
-        return "|".join(parts)
-
-    for sheet_name, cfg in sheets_config.items():
+    sheet_items = list(sheets_config.items())
+    results = None
+    # a single worker only adds spawn cost and a second workbook parse per sheet
+    workers = min(len(sheet_items), MAX_SHEET_WORKERS, os.cpu_count() or 1)
+    if workers > 1 and source_size(original_bytes) + source_size(website_bytes) >= PARALLEL_MIN_BYTES:
         try:
-            df_orig = pd.read_excel(io.BytesIO(original_bytes), sheet_name=sheet_name, header=cfg['header_row'] - 1)
-            df_web  = pd.read_excel(io.BytesIO(website_bytes),  sheet_name=sheet_name, header=cfg['header_row'] - 1)
-
-            common_cols = [c for c in df_orig.columns if c in df_web.columns]
-
-            if sheet_name in ("ScheduleFA", "transaction_details", "transaction_details_by_gain","dividend_transaction_details"):
-                common_cols = [
-                    c for c in common_cols 
-                    if c != "Sl. No."
-                ]
-
-            structured_common = []
-            structured_diff   = []
-            structured_only_orig = []
-            structured_only_web  = []
-
-            if not common_cols:
-                output_wb.create_sheet(title=make_safe_title(sheet_name, output_wb))
-                output_wb.create_sheet(title=make_safe_title(f"{sheet_name} Common Rows", output_wb))
-                summary_rows.append([sheet_name, 0, 0, 0, 0, 0])
-                sheets_structured[sheet_name] = {
-                    "common_rows": structured_common,
-                    "different_rows": structured_diff,
-                    "only_in_original_rows": structured_only_orig,
-                    "only_in_website_rows": structured_only_web,
-                    "rows_compared": 0,
-                    "cells_different": 0
-                }
-                continue
-
-            df_orig = df_orig[common_cols].copy()
-            df_web  = df_web[common_cols].copy()
-
-            original_ws = original_wb[sheet_name] if sheet_name in original_wb.sheetnames else None
-            website_ws  = website_wb[sheet_name]  if sheet_name in website_wb.sheetnames  else None
-            main_title = make_safe_title(sheet_name, output_wb)
-            _ = output_wb.create_sheet(title=main_title)
-
-            diff_count       = 0
-            rows_compared    = 0
-
-            def make_tripled_headers():
-                headers = []
-                for col in common_cols:
-                    headers.extend([f"{col} (Original)", f"{col} (Website)", f"{col} (Diff)"])
-                structured_common.append([h for h in headers])
-                structured_diff.append([h for h in headers])
-                structured_only_orig.append([h for h in headers])
-                structured_only_web.append([h for h in headers])
-
-            def make_simple_headers():
-                headers = [c for c in common_cols] + ["Row Status"]
-                structured_common.append([h for h in headers])
-                structured_diff.append([h for h in headers])
-                structured_only_orig.append([h for h in headers])
-                structured_only_web.append([h for h in headers])
-
-            if sheet_name in ("Gain Summary", "ScheduleFA", "transaction_details","transaction_details_by_gain","dividend_transaction_details") and ("Account Number" in df_orig.columns) and ("Account Number" in df_web.columns):
-                make_tripled_headers()
-
-                preferred_keys = ["Account Number", "Investment Name", "Purchase Date",]
-                use_composite = all(k in df_orig.columns and k in df_web.columns for k in preferred_keys)
-                if use_composite:
-                    key_cols = preferred_keys
-                else:
-                    key_cols = ["Account Number"]
+            original_src = worker_source(original_bytes)
+            website_src  = worker_source(website_bytes)
+            # spawned, not forked: forking a threaded server process can deadlock the children
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                futures = [pool.submit(compare_sheet, original_src, website_src, name, cfg) for name, cfg in sheet_items]
+                results = [f.result() for f in futures]
+        except Exception:
+            traceback.print_exc()
+            results = None
 
-                if sheet_name == "dividend_transaction_details":
-                    special_keys = ["Account Number", "symbol", "date received"]
-                    if all(k in df_orig.columns and k in df_web.columns for k in special_keys):
-                        key_cols = special_keys
+    if results is None:
+        # parse each upload once (read-only, cached values); every sheet reads from these
+        original_xls = open_workbook(original_bytes)
+        website_xls  = open_workbook(website_bytes)
+        results = [compare_sheet(original_xls, website_xls, name, cfg) for name, cfg in sheet_items]
+        original_xls.close()
+        website_xls.close()
 
-                try:
-                    df_orig = df_orig.drop_duplicates(subset=key_cols, keep="first").reset_index(drop=True)
-                    df_web  = df_web.drop_duplicates(subset=key_cols, keep="first").reset_index(drop=True)
-                except Exception:
-                    df_orig = df_orig.reset_index(drop=True)
-                    df_web = df_web.reset_index(drop=True)
-
-                # Gain Summary
-                if sheet_name == "Gain Summary":
-                    web_key_index = build_key_index(df_web, max_parts=2)
-                    orig_keys_set = {row_key(r, max_parts=2) for _, r in df_orig.iterrows()}
-
-                    for orig_idx, orig_row in df_orig.iterrows():
-                        k = row_key(orig_row, max_parts=2)
-                        match_indices = web_key_index.get(k, [])
-                        match_idx = match_indices[0] if match_indices else None
-
-                        if match_idx is None:
-                            triple_row = []
-                            for col in common_cols:
-                                o_val = norm_for_json(orig_row[col])
-                                triple_row.extend([o_val, "", "Only in Original"])
-                            structured_only_orig.append(triple_row)
-                            rows_compared += 1
-                            diff_count += 1
-                            continue
-
-                        web_row = df_web.loc[match_idx]
-                        all_same = all(values_equal(orig_row[col], web_row[col]) for col in common_cols)
-                        if all_same:
-                            triple_row = []
-                            for col in common_cols:
-                                val = norm_for_json(orig_row[col])
-                                triple_row.extend([val, val, ""])
-                            structured_common.append(triple_row)
-                            continue
-
-                        row_diffs_here = 0
-                        triple_row = []
-                        for col in common_cols:
-                            o_val = orig_row[col]
-                            w_val = web_row[col]
-                            is_diff = values_different(o_val, w_val)
-                            diff_val = ""
-                            if is_diff:
-                                o_num = coerce_numeric(o_val)
-                                w_num = coerce_numeric(w_val)
-                                if o_num is not None and w_num is not None:
-                                    diff_val = w_num - o_num
-                                else:
-                                    diff_val = "DIFF"
-                                row_diffs_here += 1
-
-                            triple_row.extend([norm_for_json(o_val), norm_for_json(w_val), norm_for_json(diff_val)])
-
-                        structured_diff.append(triple_row)
-                        rows_compared += 1
-                        diff_count += row_diffs_here
-
-                    for web_idx, web_row in df_web.iterrows():
-                        k = row_key(web_row, max_parts=2)
-                        if k in orig_keys_set:
-                            continue
-                        triple_row = []
-                        for col in common_cols:
-                            w_val = norm_for_json(web_row[col])
-                            triple_row.extend(["", w_val, "Only in Website"])
-                        structured_only_web.append(triple_row)
-                        rows_compared += 1
-                        diff_count += 1
+    for (sheet_name, _), (summary_row, sdata, placeholders) in zip(sheet_items, results):
+        titles = [make_safe_title(t, used_titles) for t in placeholders]
+        reserved_titles.extend(titles)
+        if "_main_ws_name" in sdata:
+            sdata["_main_ws_name"] = titles[0]
+        summary_rows.append(summary_row)
+        sheets_structured[sheet_name] = sdata
 
-                else:
-                    orig_map = {}
-                    web_map = {}
-                    if len(key_cols) == 1 and key_cols[0] == "Account Number":
-                        for i, r in df_orig.iterrows():
-                            k = acct_key(r["Account Number"])
-                            if k is not None and k not in orig_map:
-                                orig_map[k] = i
-                        for i, r in df_web.iterrows():
-                            k = acct_key(r["Account Number"])
-                            if k is not None and k not in web_map:
-                                web_map[k] = i
-                    else:
-                        for i, r in df_orig.iterrows():
-                            k = composite_acct_key(r, key_cols)
-                            if k is not None and k not in orig_map:
-                                orig_map[k] = i
-                        for i, r in df_web.iterrows():
-                            k = composite_acct_key(r, key_cols)
-                            if k is not None and k not in web_map:
-                                web_map[k] = i
-
-                    for acc in orig_map.keys():
-                        orig_idx = orig_map[acc]
-                        orig_row = df_orig.loc[orig_idx]
-                        if acc not in web_map:
-                            triple_row = []
-                            for col in common_cols:
-                                o_val = norm_for_json(orig_row[col])
-                                triple_row.extend([o_val, "", "Only in Original"])
-                            structured_only_orig.append(triple_row)
-                            rows_compared += 1
-                            diff_count += 1
-                            continue
-
-                        web_idx = web_map[acc]
-                        web_row = df_web.loc[web_idx]
-                        all_same = all(values_equal(orig_row[col], web_row[col]) for col in common_cols)
-                        if all_same:
-                            triple_row = []
-                            for col in common_cols:
-                                val = norm_for_json(orig_row[col])
-                                triple_row.extend([val, val, ""])
-                            structured_common.append(triple_row)
-                            continue
-
-                        row_diffs_here = 0
-                        triple_row = []
-                        for col in common_cols:
-                            o_val = orig_row[col]
-                            w_val = web_row[col]
-                            is_diff = values_different(o_val, w_val)
-                            diff_val = ""
-                            if is_diff:
-                                o_num = coerce_numeric(o_val)
-                                w_num = coerce_numeric(w_val)
-                                if o_num is not None and w_num is not None:
-                                    diff_val = w_num - o_num
-                                else:
-                                    diff_val = "DIFF"
-                                row_diffs_here += 1
-
-                            triple_row.extend([norm_for_json(o_val), norm_for_json(w_val), norm_for_json(diff_val)])
-
-                        structured_diff.append(triple_row)
-                        rows_compared += 1
-                        diff_count += row_diffs_here
-
-                    for acc in web_map.keys():
-                        if acc in orig_map:
-                            continue
-                        web_idx = web_map[acc]
-                        web_row = df_web.loc[web_idx]
-                        triple_row = []
-                        for col in common_cols:
-                            w_val = norm_for_json(web_row[col])
-                            triple_row.extend(["", w_val, "Only in Website"])
-                        structured_only_web.append(triple_row)
-                        rows_compared += 1
-                        diff_count += 1
-
-            # General compare logic
-            else:
-                make_simple_headers()
-                web_key_index = build_key_index(df_web, max_parts=2)
-
-                orig_key_set = {row_key(r, max_parts=2) for _, r in df_orig.iterrows()}
-
-                for orig_idx, orig_row in df_orig.iterrows():
-                    k = row_key(orig_row, max_parts=2)
-                    match_indices = web_key_index.get(k, [])
-                    match_idx = match_indices[0] if match_indices else None
-
-                    if match_idx is None:
-                        rowvals = [norm_for_json(orig_row[col]) for col in common_cols] + ["Only in Original"]
-                        structured_only_orig.append(rowvals)
-                        rows_compared += 1
-                        diff_count += 1
-                        continue
-
-                    web_row = df_web.loc[match_idx]
-                    if all(values_equal(orig_row[col], web_row[col]) for col in common_cols):
-                        rowvals = [norm_for_json(orig_row[col]) for col in common_cols] + ["Common"]
-                        structured_common.append(rowvals)
-                        continue
-
-                    row_diffs_here = 0
-                    rowvals = []
-                    for col in common_cols:
-                        o_val = orig_row[col]
-                        w_val = web_row[col]
-                        if values_different(o_val, w_val):
-                            row_diffs_here += 1
-                        rowvals.append(norm_for_json(o_val))
-                    rowvals.append("Different")
-                    structured_diff.append(rowvals)
-                    rows_compared += 1
-                    diff_count += row_diffs_here
-
-                for web_idx, web_row in df_web.iterrows():
-                    k = row_key(web_row, max_parts=2)
-                    if k in orig_key_set:
-                        continue
-                    rowvals = [norm_for_json(web_row[col]) for col in common_cols] + ["Only in Website"]
-                    structured_only_web.append(rowvals)
-                    rows_compared += 1
-                    diff_count += 1
-
-            sheets_structured[sheet_name] = {
-                "common_rows": structured_common,
-                "different_rows": structured_diff,
-                "only_in_original_rows": structured_only_orig,
-                "only_in_website_rows": structured_only_web,
-                "rows_compared": rows_compared,
-                "cells_different": diff_count,
-                "_main_ws_name": main_title
-            }
+    return summary_rows, sheets_structured, reserved_titles, used_titles
 
-            summary_rows.append([sheet_name, rows_compared, diff_count, len(structured_common), len(structured_only_orig), len(structured_only_web)])
 
-        except Exception as e:
-            traceback.print_exc()
-            summary_rows.append([sheet_name, 0, f"ERROR: {e}", 0, 0, 0])
-            sheets_structured[sheet_name] = {
-                "common_rows": [],
-                "different_rows": [],
-                "only_in_original_rows": [],
-                "only_in_website_rows": [],
-                "rows_compared": 0,
-                "cells_different": 0,
-                "error": str(e)
-            }
+def _write_report_workbook(summary_rows, sheets_structured, reserved_titles, used_titles, output, return_structured=True):
+    """Build the styled comparison workbook from _compare_core output and save it to output."""
+
+    output_wb   = openpyxl.Workbook(write_only=True)
+    fill_styles = {}
+
+    for title in reserved_titles:
+        output_wb.create_sheet(title=title)
+
+    allowed_sheets = {
+        "Summary",
+        "Gain Summary", "ScheduleFA", "transaction_details", "transaction_details_by_gain","dividend_transaction_details",
+        "Gain Summary Common Rows", "ScheduleFA Common Rows",
+        "transaction_details Common Rows", "transaction_details_by_gain Common Rows","dividend_transaction_details Common Rows",
+    }
 
     for sheet_name, sdata in list(sheets_structured.items()):
         if not isinstance(sdata, dict):
@@ -510,25 +735,18 @@ def compare_excel_with_gain_summary_inline_India(
 
         common_rows = sdata.get("common_rows") or []
         if len(common_rows) > 1:
-            safe_common_title = make_safe_title(f"{sheet_name} Common Rows", output_wb)
+            safe_common_title = make_safe_title(f"{sheet_name} Common Rows", used_titles)
             if safe_common_title in output_wb.sheetnames:
                 try:
                     del output_wb[safe_common_title]
                 except Exception:
                     pass
-            ws_common = output_wb.create_sheet(title=safe_common_title)
-            for r in common_rows:
-                ws_common.append(r)
-            for col_idx in range(1, ws_common.max_column + 1):
-                col_letter = get_column_letter(col_idx)
-                max_len = 0
-                for cell in ws_common[col_letter]:
-                    if cell.value is not None:
-                        try:
-                            max_len = max(max_len, len(str(cell.value)))
-                        except Exception:
-                            max_len = max(max_len, 10)
-                ws_common.column_dimensions[col_letter].width = min(max_len + 2, 50)
+            # rows streamed into a write-only sheet can't be discarded later
+            if safe_common_title in allowed_sheets:
+                ws_common = output_wb.create_sheet(title=safe_common_title)
+                set_column_widths(ws_common, column_widths(common_rows))
+                for r in common_rows:
+                    ws_common.append(r)
 
         header = None
         for key in ("different_rows", "common_rows", "only_in_original_rows", "only_in_website_rows"):
@@ -537,57 +755,51 @@ def compare_excel_with_gain_summary_inline_India(
                 header = lst[0]
                 break
 
-        remaining_rows = []
-        for key in ("different_rows", "only_in_original_rows", "only_in_website_rows"):
-            lst = sdata.get(key) or []
-            if len(lst) > 1:
-                remaining_rows.extend(lst[1:])
+        def remaining_rows():
+            return chain.from_iterable(
+                islice(sdata.get(key) or [], 1, None)
+                for key in ("different_rows", "only_in_original_rows", "only_in_website_rows")
+            )
 
         main_ws_name = sdata.get("_main_ws_name")
-        safe_name = main_ws_name if main_ws_name else make_safe_title(sheet_name, output_wb)
+        safe_name = main_ws_name if main_ws_name else make_safe_title(sheet_name, used_titles)
         if safe_name in output_wb.sheetnames:
             try:
                 del output_wb[safe_name]
             except Exception:
                 pass
+        if safe_name not in allowed_sheets:
+            if not return_structured:
+                drop_rows(sdata)
+            continue
         new_ws = output_wb.create_sheet(title=safe_name)
+        # sized from the plain values first, so each styled row is streamed out as it is built
+        set_column_widths(new_ws, column_widths(chain([header] if header else [], remaining_rows())))
         if header:
             new_ws.append(header)
-        for r in remaining_rows:
-            new_ws.append(r)
+        for r in remaining_rows():
+            cells = []
             for col_idx, val in enumerate(r, start=1):
                 if col_idx % 3 == 1:
-                    new_ws.cell(row=new_ws.max_row, column=col_idx).fill = original_fill
+                    cell = filled_cell(new_ws, val, original_fill, fill_styles)
                 elif col_idx % 3 == 2:
-                    new_ws.cell(row=new_ws.max_row, column=col_idx).fill = website_fill
-                elif col_idx % 3 == 0:
-                    if val != "" and val != 0:
-                        new_ws.cell(row=new_ws.max_row, column=col_idx).fill = diff_fill
-        for col_idx in range(1, new_ws.max_column + 1):
-            col_letter = get_column_letter(col_idx)
-            max_len = 0
-            for cell in new_ws[col_letter]:
-                if cell.value is not None:
-                    try:
-                        max_len = max(max_len, len(str(cell.value)))
-                    except Exception:
-                        max_len = max(max_len, 10)
-            new_ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
-
-    ws_summary = output_wb.create_sheet(make_safe_title("Summary", output_wb), index=0)
+                    cell = filled_cell(new_ws, val, website_fill, fill_styles)
+                elif val != "" and val != 0:
+                    cell = filled_cell(new_ws, val, diff_fill, fill_styles)
+                else:
+                    cell = WriteOnlyCell(new_ws, value=val)
+                cells.append(cell)
+            new_ws.append(cells)
+        if not return_structured:
+            drop_rows(sdata)
+
+    ws_summary = output_wb.create_sheet(make_safe_title("Summary", used_titles), index=0)
     ws_summary.append(["Excel Comparison Report"])
     ws_summary.append([f"Generated On:  {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
     ws_summary.append([])
     for row in summary_rows:
         ws_summary.append(row)
 
-    allowed_sheets = {
-        "Summary",
-        "Gain Summary", "ScheduleFA", "transaction_details", "transaction_details_by_gain","dividend_transaction_details",
-        "Gain Summary Common Rows", "ScheduleFA Common Rows",
-        "transaction_details Common Rows", "transaction_details_by_gain Common Rows","dividend_transaction_details Common Rows",
-    }
-
     for sheet in list(output_wb.sheetnames):
         if sheet not in allowed_sheets:
             try:
@@ -595,12 +807,32 @@ def compare_excel_with_gain_summary_inline_India(
             except Exception:
                 pass
 
-    out_bytes = io.BytesIO()
-    output_wb.save(out_bytes)
-    out_bytes.seek(0)
+    output_wb.save(output)
+
+
+def compare_excel_with_gain_summary_inline_India(
+    original_bytes: ExcelSource,
+    website_bytes: ExcelSource,
+    sheets_config: Optional[Dict[str, Dict[str, int]]] = None,
+    return_structured: bool = True,
+    build_workbook: bool = True,
+) -> Dict[str, Any]:
+    """Compare the configured sheets of two uploads. With build_workbook=False the styled
+    report is skipped and excel_bytes is None, for callers that only need the rows."""
+
+    summary_rows, sheets_structured, reserved_titles, used_titles = _compare_core(
+        original_bytes, website_bytes, sheets_config
+    )
+    excel_bytes = None
+    if build_workbook:
+        out_bytes = io.BytesIO()
+        _write_report_workbook(
+            summary_rows, sheets_structured, reserved_titles, used_titles, out_bytes, return_structured
+        )
+        excel_bytes = out_bytes.getvalue()
 
     return {
-        "excel_bytes": out_bytes.getvalue(),
+        "excel_bytes": excel_bytes,
         "summary_rows": summary_rows,
         "sheets": sheets_structured
     }
@@ -608,7 +840,7 @@ def compare_excel_with_gain_summary_inline_India(
 
 # HTML report
 def write_html_report_India(summary_rows):
-    html = """
+    parts = ["""
     <html>
     <head>
         <title>Excel Comparison Report</title>
@@ -630,22 +862,24 @@ def write_html_report_India(summary_rows):
                 <th>Only in Original</th>
                 <th>Only in Website</th>
             </tr>
-    """
-    for row in summary_rows[1:]: 
-        html += "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>"
-
-    html += """
+    """]
+    # cells carry sheet names and error text, so they are escaped
+    parts.extend(
+        "<tr>" + "".join(f"<td>{escape(str(cell))}</td>" for cell in row) + "</tr>"
+        for row in summary_rows[1:]
+    )
+    parts.append("""
         </table>
     </body>
     </html>
-    """
-    return html
+    """)
+    return "".join(parts)
 
 
-def compare_excel_sheets_inline_India(original_bytes, website_bytes, sheets_config=None):
-    result = compare_excel_with_gain_summary_inline_India(original_bytes, website_bytes, sheets_config)
+def sheets_with_differences_India(sheets):
+    """{"sheets": [...]} naming the compared sheets that have any differing or unmatched rows."""
     sheets_with_diff = []
-    for sname, sdata in result["sheets"].items():
+    for sname, sdata in sheets.items():
         if (len(sdata.get("different_rows", [])) > 1 or
             len(sdata.get("only_in_original_rows", [])) > 1 or
             len(sdata.get("only_in_website_rows", [])) > 1):
@@ -653,9 +887,8 @@ def compare_excel_sheets_inline_India(original_bytes, website_bytes, sheets_conf
     return {"sheets": sheets_with_diff}
 
 
-def compare_single_sheet_diff_inline_India(original_bytes, website_bytes, sheet_name, sheets_config=None):
-    result = compare_excel_with_gain_summary_inline_India(original_bytes, website_bytes, sheets_config)
-    sheets = result.get("sheets", {})
+def single_sheet_diff_India(sheets, sheet_name):
+    """The row groups of one compared sheet; empty lists when it wasn't compared."""
     target = sheets.get(sheet_name)
     if not target:
         return {
@@ -675,6 +908,21 @@ def compare_single_sheet_diff_inline_India(original_bytes, website_bytes, sheet_
     }
 
 
+def compare_excel_sheets_inline_India(original_bytes, website_bytes, sheets_config=None):
+    _, sheets, _, _ = _compare_core(original_bytes, website_bytes, sheets_config)
+    return sheets_with_differences_India(sheets)
+
+
+def compare_single_sheet_diff_inline_India(original_bytes, website_bytes, sheet_name, sheets_config=None):
+    _, sheets, _, _ = _compare_core(original_bytes, website_bytes, sheets_config)
+    return single_sheet_diff_India(sheets, sheet_name)
+
+
 def generate_comparison_excel_India(original_bytes, website_bytes, output_stream, sheets_config=None):
-    result = compare_excel_with_gain_summary_inline_India(original_bytes, website_bytes, sheets_config)
-    output_stream.write(result["excel_bytes"])
+    # saved straight into the caller's stream, no intermediate xlsx bytes
+    summary_rows, sheets_structured, reserved_titles, used_titles = _compare_core(
+        original_bytes, website_bytes, sheets_config
+    )
+    _write_report_workbook(
+        summary_rows, sheets_structured, reserved_titles, used_titles, output_stream, return_structured=False
+    )
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import io
+from datetime import datetime
 
-# Create your tests here.
+from unittest import mock
+
+import openpyxl
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from . import excel_comparator, views
+from .excel_comparator import compare_excel_with_gain_summary_inline, write_html_report
+from .excel_comparator_india import (
+    compare_excel_sheets_inline_India,
+    compare_excel_with_gain_summary_inline_India,
+    compare_single_sheet_diff_inline_India,
+)
+
+
+def make_workbook(sheets):
+    """xlsx bytes with one sheet per {name: (header_row, rows)} entry; rows start at header_row."""
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for name, (header_row, rows) in sheets.items():
+        ws = wb.create_sheet(name)
+        for _ in range(header_row - 1):
+            ws.append(["Report"])
+        for row in rows:
+            ws.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def compare(compare_fn, sheet_name, header_row, original_rows, website_rows):
+    config = {sheet_name: {"header_row": header_row, "data_start_row": header_row + 1}}
+    result = compare_fn(
+        make_workbook({sheet_name: (header_row, original_rows)}),
+        make_workbook({sheet_name: (header_row, website_rows)}),
+        sheets_config=config,
+    )
+    return result["summary_rows"][1], result["sheets"][sheet_name]
+
+
+class GainSummaryCompareTests(SimpleTestCase):
+    header = ["Account Number", "Symbol", "Gain"]
+
+    def test_rows_match_on_leading_columns(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline, "Gain Summary", 2,
+            [self.header, [1001, "AAPL", 100], [1002, "MSFT", 50], [1003, "TSLA", 7]],
+            [self.header, [1001, "AAPL", 100], [1002, "MSFT", 75], [1004, "TSLA", 7]],
+        )
+        self.assertEqual(summary, ["Gain Summary", 3, 3, 2, 2, 2])
+        self.assertEqual(sheet["common_rows"][1:], [
+            [1001, 1001, "", "AAPL", "AAPL", "", 100, 100, ""],
+        ])
+        self.assertEqual(sheet["different_rows"][1:], [
+            [1002, 1002, "", "MSFT", "MSFT", "", 50, 75, 25.0],
+        ])
+        self.assertEqual(sheet["only_in_website_rows"][1:], [
+            ["", 1004, "Only in Website", "", "TSLA", "Only in Website", "", 7, "Only in Website"],
+        ])
+
+
+class AccountKeyedCompareTests(SimpleTestCase):
+    header = ["Account Number", "Balance", "Name"]
+
+    def test_numeric_account_numbers(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline, "FBAR", 2,
+            [self.header, [1001, 5, "a"], [1002, 6, "b"], [1003, 7, "c"]],
+            [self.header, [1001, 5, "a"], [1002, 9, "b"], [1004, 7, "c"]],
+        )
+        self.assertEqual(summary, ["FBAR", 3, 3, 2, 2, 2])
+        self.assertEqual(sheet["different_rows"][1:], [
+            [1002, 1002, "", 6, 9, 3.0, "b", "b", ""],
+        ])
+        self.assertEqual(sheet["only_in_original_rows"][1:], [
+            [1003, "", "Only in Original", 7, "", "Only in Original", "c", "", "Only in Original"],
+        ])
+
+    def test_object_text_dtype_without_pyarrow(self):
+        with mock.patch.object(excel_comparator, "TEXT_DTYPE", object):
+            summary, sheet = compare(
+                compare_excel_with_gain_summary_inline, "FBAR", 2,
+                [self.header, [1001, 5, "a"], ["X-9", 6, "b"], [None, 1, "c"]],
+                [self.header, [1001, 5, "a"], ["x-9", 9, "b"], [None, 1, "c"]],
+            )
+        self.assertEqual(summary, ["FBAR", 1, 1, 2, 1, 1])
+        self.assertEqual(sheet["different_rows"][1:], [["X-9", "x-9", "", 6, 9, 3.0, "b", "b", ""]])
+
+    def test_long_account_numbers_keep_distinct_keys(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline, "FBAR", 2,
+            [self.header, ["DE89370400440532013000", 5, "a"], ["FR7630006000011234567890189", 6, "b"]],
+            [self.header, ["DE89370400440532013000", 5, "a"], ["FR7630006000011234567890189", 60, "b"]],
+        )
+        self.assertEqual(summary, ["FBAR", 1, 1, 2, 1, 1])
+        self.assertEqual(sheet["different_rows"][1:], [
+            ["FR7630006000011234567890189", "FR7630006000011234567890189", "", 6, 60, 54.0, "b", "b", ""],
+        ])
+
+    def test_text_and_boolean_account_numbers(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline, "FBAR", 2,
+            [self.header, [True, 5, "a"], ["a1", 6, "b"], ["X-9", 1, "c"]],
+            [self.header, [True, 5, "a"], ["a1", 6, "b"], ["x-9", 1, "d"]],
+        )
+        self.assertEqual(summary, ["FBAR", 1, 1, 3, 1, 1])
+        self.assertEqual(sheet["different_rows"][1:], [
+            ["X-9", "x-9", "", 1, 1, "", "c", "d", "DIFF"],
+        ])
+
+
+class CompositeKeyCompareTests(SimpleTestCase):
+    header = ["Account Number", "Investment Name", "Purchase Date", "Value"]
+
+    def test_account_name_and_date_key(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline, "8938", 6,
+            [self.header,
+             [1001, "Fund A", datetime(2023, 1, 5), 10],
+             [1001, "Fund B", "05/01/2023", 11],
+             [1002, "Fund C", datetime(2023, 3, 1), 12]],
+            [self.header,
+             [1001, "Fund A", datetime(2023, 1, 5), 10],
+             [1001, "Fund B", "05/01/2023", 13],
+             [1003, "Fund C", datetime(2023, 3, 1), 12]],
+        )
+        self.assertEqual(summary, ["8938", 3, 3, 2, 2, 2])
+        self.assertEqual(sheet["different_rows"][1:], [
+            [1001, 1001, "", "Fund B", "Fund B", "", "05/01/2023", "05/01/2023", "", 11, 13, 2.0],
+        ])
+
+
+class GeneralCompareTests(SimpleTestCase):
+    header = ["Symbol", "Quantity", "Price"]
+
+    def test_sheet_without_account_number(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline, "Holdings", 1,
+            [self.header, ["AAPL", 10, "(1,234.50)"], ["MSFT", 5, 300], ["IBM", 1, 1]],
+            [self.header, ["AAPL", 10, "-1234.5"], ["MSFT", 5, 310], ["ORCL", 2, 2]],
+        )
+        self.assertEqual(summary, ["Holdings", 3, 3, 2, 2, 2])
+        self.assertEqual(sheet["common_rows"][1:], [["AAPL", 10, "(1,234.50)", "Common"]])
+        self.assertEqual(sheet["different_rows"][1:], [["MSFT", 5, 300, "Different"]])
+        self.assertEqual(sheet["only_in_original_rows"][1:], [["IBM", 1, 1, "Only in Original"]])
+
+
+class IndiaCompareTests(SimpleTestCase):
+    header = ["Sl. No.", "Account Number", "symbol", "date received", "Amount"]
+
+    def test_dividend_rows_keyed_on_symbol_and_date(self):
+        summary, sheet = compare(
+            compare_excel_with_gain_summary_inline_India, "dividend_transaction_details", 2,
+            [self.header, [1, 1001, "INFY", "01/04/2023", 100], [2, 1001, "TCS", "01/04/2023", 50]],
+            [self.header, [7, 1001, "INFY", "01/04/2023", 100], [8, 1001, "TCS", "01/04/2023", 55]],
+        )
+        self.assertEqual(summary, ["dividend_transaction_details", 1, 1, 2, 1, 1])
+        self.assertEqual(sheet["different_rows"][1:], [
+            [1001, 1001, "", "TCS", "TCS", "", "01/04/2023", "01/04/2023", "", 50, 55, 5.0],
+        ])
+
+    def test_sheet_helpers_skip_the_report_workbook(self):
+        config = {"ScheduleFA": {"header_row": 2, "data_start_row": 3}}
+        original = make_workbook({"ScheduleFA": (2, [["Account Number", "Amount"], [1001, 5]])})
+        website = make_workbook({"ScheduleFA": (2, [["Account Number", "Amount"], [1001, 7]])})
+        with mock.patch.object(openpyxl.Workbook, "save") as save:
+            sheets = compare_excel_sheets_inline_India(original, website, config)
+            diff = compare_single_sheet_diff_inline_India(original, website, "ScheduleFA", config)
+        save.assert_not_called()
+        self.assertEqual(sheets, {"sheets": ["ScheduleFA"]})
+        self.assertEqual(diff["different_rows"][1:], [[1001, 1001, "", 5, 7, 2.0]])
+
+
+class PooledCompareTests(SimpleTestCase):
+    header = ["Account Number", "Balance", "Name"]
+    config = {
+        "FBAR": {"header_row": 2, "data_start_row": 3},
+        "Gain Summary": {"header_row": 2, "data_start_row": 3},
+    }
+
+    def setUp(self):
+        self.original = make_workbook({
+            "FBAR": (2, [self.header, [1001, 5, "a"], [1002, 6, "b"], [1003, 7, "c"]]),
+            "Gain Summary": (2, [self.header, [1001, 1, "x"], [1002, 2, "y"]]),
+        })
+        self.website = make_workbook({
+            "FBAR": (2, [self.header, [1001, 5, "a"], [1002, 9, "b"], [1004, 7, "c"]]),
+            "Gain Summary": (2, [self.header, [1001, 1, "x"], [1002, 3, "y"]]),
+        })
+
+    def pooled(self, original, website):
+        # the parent only opens the workbooks itself on the serial path
+        with mock.patch.object(excel_comparator, "PARALLEL_MIN_BYTES", 0), \
+                mock.patch("os.cpu_count", return_value=2), \
+                mock.patch.object(excel_comparator, "open_workbook", wraps=excel_comparator.open_workbook) as open_fn:
+            result = compare_excel_with_gain_summary_inline(original, website, self.config, build_workbook=False)
+        open_fn.assert_not_called()
+        return result
+
+    def test_pool_matches_serial_compare(self):
+        serial = compare_excel_with_gain_summary_inline(self.original, self.website, self.config, build_workbook=False)
+        for original, website in [
+            (self.original, self.website),
+            (io.BytesIO(self.original), io.BytesIO(self.website)),
+        ]:
+            pooled = self.pooled(original, website)
+            self.assertEqual(pooled["summary_rows"], serial["summary_rows"])
+            self.assertEqual(pooled["sheets"], serial["sheets"])
+
+
+class ComparisonCacheTests(SimpleTestCase):
+    header = ["Account Number", "Balance", "Name"]
+
+    def setUp(self):
+        cache.clear()
+        self.original = make_workbook({"FBAR": (2, [self.header, [1001, 5, "a"], [1002, 6, "b"]])})
+        self.website = make_workbook({"FBAR": (2, [self.header, [1001, 5, "a"], [1002, 9, "b"]])})
+
+    def post(self, url, **data):
+        data.update(
+            original_file=SimpleUploadedFile("original.xlsx", self.original),
+            website_file=SimpleUploadedFile("website.xlsx", self.website),
+        )
+        return self.client.post(url, data)
+
+    def test_sheet_browsing_reuses_one_comparison(self):
+        with mock.patch.object(
+            views, "compare_excel_with_gain_summary_inline", wraps=compare_excel_with_gain_summary_inline,
+        ) as compare_fn:
+            sheets = self.post("/api/compare/sheets").json()
+            diff = self.post("/api/compare/sheet/diff", sheet_name="FBAR").json()
+        self.assertEqual(compare_fn.call_count, 1)
+        self.assertIs(compare_fn.call_args.kwargs["build_workbook"], False)
+        self.assertEqual(sheets, {"sheets": ["FBAR"]})
+        self.assertEqual(diff["different_rows"][1:], [[1002, 1002, "", 6, 9, 3.0, "b", "b", ""]])
+
+    def test_changed_upload_is_compared_again(self):
+        with mock.patch.object(
+            views, "compare_excel_with_gain_summary_inline", wraps=compare_excel_with_gain_summary_inline,
+        ) as compare_fn:
+            self.post("/api/compare/json")
+            self.website = self.original
+            results = self.post("/api/compare/json").json()["results"]
+        self.assertEqual(compare_fn.call_count, 2)
+        self.assertIn(["FBAR", 0, 0, 3, 1, 1], results)
+
+
+class ExcelFileEndpointTests(SimpleTestCase):
+    def test_download_is_a_readable_workbook(self):
+        header = ["Account Number", "Balance", "Name"]
+        response = self.client.post("/api/compare/excel", {
+            "original_file": SimpleUploadedFile("original.xlsx", make_workbook({"FBAR": (2, [header, [1001, 5, "a"]])})),
+            "website_file": SimpleUploadedFile("website.xlsx", make_workbook({"FBAR": (2, [header, [1001, 7, "a"]])})),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Comparison_Result.xlsx", response["Content-Disposition"])
+        wb = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(wb.sheetnames[0], "Summary")
+        self.assertIn("FBAR", wb.sheetnames)
+        response.close()
+
+
+class HtmlReportTests(SimpleTestCase):
+    def test_cells_are_escaped(self):
+        html = write_html_report([
+            ["Sheet"],
+            ["<b>FBAR</b>", 0, "ERROR: 'x' & y", 0, 0, 0],
+        ])
+        self.assertIn("<td>&lt;b&gt;FBAR&lt;/b&gt;</td>", html)
+        self.assertIn("<td>ERROR: &#x27;x&#x27; &amp; y</td>", html)
@@ -1,22 +1,95 @@
 import json
-from django.http import JsonResponse, FileResponse
+import hashlib
+import tempfile
+from functools import lru_cache
+from django.http import HttpResponse, JsonResponse, FileResponse
+from django.core.cache import cache
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render
-from io import BytesIO
 from .excel_comparator_india import ( 
     compare_excel_with_gain_summary_inline_India,
     write_html_report_India,
-    generate_comparison_excel_India
+    generate_comparison_excel_India,
+    sheets_with_differences_India,
+    single_sheet_diff_India,
 )
 
 from .excel_comparator import (
     write_html_report,
     compare_excel_with_gain_summary_inline,
-    compare_excel_sheets_inline,
-    compare_single_sheet_diff_inline,
     generate_comparison_excel,
+    sheets_with_differences,
+    single_sheet_diff,
 )
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# the sheet browser posts the same pair of uploads once per click
+COMPARISON_CACHE_TIMEOUT = 15 * 60
+
+
+@lru_cache(maxsize=128)
+def parse_sheets_config(sheets_config):
+    """The posted sheets_config JSON, or None when absent or malformed. Clients resend the
+    same string on every request, so parses are cached; callers must not mutate the result."""
+    if not sheets_config:
+        return None
+    try:
+        return json.loads(sheets_config)
+    except Exception:
+        return None
+
+
+def upload_source(upload):
+    """The temp-file path for uploads Django spooled to disk, else the in-memory file; never a .read() copy."""
+    if isinstance(upload, TemporaryUploadedFile):
+        return upload.temporary_file_path()
+    return upload.file
+
+
+def upload_digest(upload):
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_comparison(country, original_file, website_file, sheets_config=None):
+    """summary_rows and sheets for an upload pair, keyed on the file contents and
+    config so repeat requests skip the compare. The report workbook is never built here."""
+    config_digest = hashlib.blake2b(json.dumps(sheets_config, sort_keys=True).encode(), digest_size=16).hexdigest()
+    key = f"excel_compare:{country}:{upload_digest(original_file)}:{upload_digest(website_file)}:{config_digest}"
+    result = cache.get(key)
+    if result is None:
+        if country == "india":
+            compare = compare_excel_with_gain_summary_inline_India
+        else:
+            compare = compare_excel_with_gain_summary_inline
+        full = compare(
+            upload_source(original_file), upload_source(website_file),
+            sheets_config=sheets_config, build_workbook=False,
+        )
+        result = {"summary_rows": full["summary_rows"], "sheets": full["sheets"]}
+        cache.set(key, result, COMPARISON_CACHE_TIMEOUT)
+    return result
+
+
+def json_response(data, status=200):
+    """JsonResponse, serialised with orjson when it is installed (the sheet payloads get large)."""
+    if orjson is not None:
+        try:
+            body = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+        except orjson.JSONEncodeError:
+            # e.g. ints wider than 64 bits; the stdlib encoder handles those
+            pass
+        else:
+            return HttpResponse(body, content_type="application/json", status=status)
+    return JsonResponse(data, status=status)
+
 
 def home(request):
     return render(request, "index.html")
@@ -26,216 +99,122 @@ def home(request):
 @csrf_exempt
 def compare_excel_api(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid request"}, status=400)
+        return json_response({"error": "Invalid request"}, status=400)
     try:
         original_file = request.FILES.get("original_file")
         website_file = request.FILES.get("website_file")
         sheets_config = request.POST.get("sheets_config")
         country = request.POST.get("country", "usa")
 
-        parsed_config = None
-        if sheets_config:
-            try:
-                parsed_config = json.loads(sheets_config)
-            except Exception:
-                parsed_config = None
+        parsed_config = parse_sheets_config(sheets_config)
 
-        if country == "india":
-            from .excel_comparator_india import compare_excel_with_gain_summary_inline_India
-            result = compare_excel_with_gain_summary_inline_India(
-                original_file.read(),
-                website_file.read(),
-                sheets_config=parsed_config,
-            )
-        else:
-            result = compare_excel_with_gain_summary_inline(
-                original_file.read(),
-                website_file.read(),
-                sheets_config=parsed_config,
-            )
-        # Remove excel_bytes from result before returning JSON
-        if "excel_bytes" in result:
-            del result["excel_bytes"]
-        return JsonResponse(result)
+        result = cached_comparison(country, original_file, website_file, parsed_config)
+        return json_response(result)
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 
 @csrf_exempt
 def compare_json_api(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid request"}, status=400)
+        return json_response({"error": "Invalid request"}, status=400)
     try:
         original_file = request.FILES.get("original_file")
         website_file = request.FILES.get("website_file")
         sheets_config = request.POST.get("sheets_config")
         country = request.POST.get("country", "usa")
 
-        parsed_config = None
-        if sheets_config:
-            try:
-                parsed_config = json.loads(sheets_config)
-            except Exception:
-                parsed_config = None
+        parsed_config = parse_sheets_config(sheets_config)
 
-        if country == "india":
-            result = compare_excel_with_gain_summary_inline_India(
-                original_file.read(),
-                website_file.read(),
-                sheets_config=parsed_config,
-            )
-        else:
-            result = compare_excel_with_gain_summary_inline(
-                original_file.read(),
-                website_file.read(),
-                sheets_config=parsed_config,
-            )
-
-        return JsonResponse({"results": result["summary_rows"]})
+        result = cached_comparison(country, original_file, website_file, parsed_config)
+        return json_response({"results": result["summary_rows"]})
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 
 @csrf_exempt
 def compare_html_api(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid request"}, status=400)
+        return json_response({"error": "Invalid request"}, status=400)
     try:
         original_file = request.FILES.get("original_file")
         website_file = request.FILES.get("website_file")
         sheets_config = request.POST.get("sheets_config")
         country = request.POST.get("country", "usa")
 
-        parsed_config = None
-        if sheets_config:
-            try:
-                parsed_config = json.loads(sheets_config)
-            except Exception:
-                parsed_config = None
+        parsed_config = parse_sheets_config(sheets_config)
 
+        result = cached_comparison(country, original_file, website_file, parsed_config)
         if country == "india":
-            result = compare_excel_with_gain_summary_inline_India(
-                original_file.read(),
-                website_file.read(),
-                sheets_config=parsed_config,
-            )
             html = write_html_report_India(result["summary_rows"])
-            return JsonResponse({"html": html})
         else:
-            result = compare_excel_with_gain_summary_inline(
-                original_file.read(),
-                website_file.read(),
-                sheets_config=parsed_config,
-            )
             html = write_html_report(result["summary_rows"])
-            return JsonResponse({"html": html})
+        return json_response({"html": html})
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 
 @csrf_exempt
 def compare_sheets_api(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid request"}, status=400)
+        return json_response({"error": "Invalid request"}, status=400)
     try:
         original_file = request.FILES.get("original_file")
         website_file = request.FILES.get("website_file")
         country = request.POST.get("country", "usa")
 
+        result = cached_comparison(country, original_file, website_file)
         if country == "india":
-            result = compare_excel_with_gain_summary_inline_India(
-                original_file.read(),
-                website_file.read(),
-            )
-            sheets_with_diff = []
-            for sname, sdata in result["sheets"].items():
-                if (len(sdata.get("different_rows", [])) > 1 or
-                    len(sdata.get("only_in_original_rows", [])) > 1 or
-                    len(sdata.get("only_in_website_rows", [])) > 1):
-                    sheets_with_diff.append(sname)
-            return JsonResponse({"sheets": sheets_with_diff})
-        else:
-            result = compare_excel_sheets_inline(
-                original_file.read(),
-                website_file.read(),
-            )
-            return JsonResponse(result)
+            return json_response(sheets_with_differences_India(result["sheets"]))
+        return json_response(sheets_with_differences(result["sheets"]))
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 
 @csrf_exempt
 def compare_sheet_diff_api(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid request"}, status=400)
+        return json_response({"error": "Invalid request"}, status=400)
     try:
         original_file = request.FILES.get("original_file")
         website_file = request.FILES.get("website_file")
         sheet_name = request.POST.get("sheet_name")
         country = request.POST.get("country", "usa")
 
+        result = cached_comparison(country, original_file, website_file)
         if country == "india":
-            result = compare_excel_with_gain_summary_inline_India(
-                original_file.read(),
-                website_file.read(),
-            )
-            sheets = result.get("sheets", {})
-            target = sheets.get(sheet_name)
-            if not target:
-                return JsonResponse({
-                    "sheet_name": sheet_name,
-                    "common_rows": [],
-                    "different_rows": [],
-                    "only_in_original_rows": [],
-                    "only_in_website_rows": []
-                })
-            return JsonResponse({
-                "sheet_name": sheet_name,
-                "common_rows": target.get("common_rows", []),
-                "different_rows": target.get("different_rows", []),
-                "only_in_original_rows": target.get("only_in_original_rows", []),
-                "only_in_website_rows": target.get("only_in_website_rows", [])
-            })
-        else:
-            result = compare_single_sheet_diff_inline(
-                original_file.read(),
-                website_file.read(),
-                sheet_name,
-            )
-            return JsonResponse(result)
+            return json_response(single_sheet_diff_India(result["sheets"], sheet_name))
+        return json_response(single_sheet_diff(result["sheets"], sheet_name))
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 
 @csrf_exempt
 def compare_excel_file_api(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Invalid request"}, status=400)
+        return json_response({"error": "Invalid request"}, status=400)
     try:
         original_file = request.FILES.get("original_file")
         website_file = request.FILES.get("website_file")
         sheets_config = request.POST.get("sheets_config")
         country = request.POST.get("country", "usa")
 
-        parsed_config = None
-        if sheets_config:
-            try:
-                parsed_config = json.loads(sheets_config)
-            except Exception:
-                parsed_config = None
+        parsed_config = parse_sheets_config(sheets_config)
 
-        output = BytesIO()
+        # spooled to an anonymous temp file: FileResponse streams it from disk and
+        # closing it (after the response is sent) deletes it
+        output = tempfile.TemporaryFile(suffix=".xlsx")
         if country == "india":
             generate_comparison_excel_India(
-                original_file.read(),
-                website_file.read(),
+                upload_source(original_file),
+                upload_source(website_file),
                 output,
                 sheets_config=parsed_config,
             )
         else:
             generate_comparison_excel(
-                original_file.read(),
-                website_file.read(),
+                upload_source(original_file),
+                upload_source(website_file),
                 output,
                 sheets_config=parsed_config,
             )
@@ -244,4 +223,4 @@ def compare_excel_file_api(request):
         response = FileResponse(output, as_attachment=True, filename="Comparison_Result.xlsx")
         return response
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
+        return json_response({"error": str(e)}, status=500)
\ No newline at end of file